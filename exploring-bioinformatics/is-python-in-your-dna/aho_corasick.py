@@ -0,0 +1,125 @@
+"""
+Aho-Corasick automaton to find many motifs in a single pass over DNA.
+
+It generalises the KMP matcher in kmp.py from one pattern to a whole
+dictionary: the failure links play the role of the failure table.
+"""
+
+import copy
+from array import array
+from utils import iter_fasta
+
+ALPHABET = "ACGT"
+# Characters outside the alphabet (like N) map to this code and break matches.
+_OTHER = len(ALPHABET)
+_CODES = bytearray([_OTHER]*256)
+for _code, _symb in enumerate(ALPHABET):
+    _CODES[ord(_symb)] = _CODES[ord(_symb.lower())] = _code
+_CODES = bytes(_CODES)
+
+class MotifSet:
+    """A dictionary of motifs compiled into an automaton with a dense transition table.
+
+    State s goes to state delta[4*s + c] on reading the base with code c, so
+    matching never follows failure links at search time.
+    """
+    def __init__(self, motifs):
+        self.motifs = list(dict.fromkeys(motifs))
+        if not self.motifs or not all(self.motifs):
+            raise ValueError("Motifs must be a non-empty collection of non-empty strings.")
+        for motif in self.motifs:
+            if not set(motif) <= set(ALPHABET):
+                raise ValueError(f"Motif {motif!r} has symbols outside of {ALPHABET}.")
+        self._build()
+        self.reset()
+
+    def _build(self):
+        width = len(ALPHABET)
+        delta = array("i", [-1]*width)
+        outputs = [()]
+        for k, motif in enumerate(self.motifs):
+            state = 0
+            for symb in motif:
+                idx = width*state + ALPHABET.index(symb)
+                if delta[idx] == -1:
+                    delta[idx] = len(outputs)
+                    delta.extend([-1]*width)
+                    outputs.append(())
+                state = delta[idx]
+            outputs[state] += (k,)
+
+        # Breadth-first pass: fill missing transitions through the failure links.
+        fail = [0]*len(outputs)
+        queue = []
+        for c in range(width):
+            if delta[c] == -1:
+                delta[c] = 0
+            else:
+                queue.append(delta[c])
+        for state in queue:
+            for c in range(width):
+                nxt = delta[width*state + c]
+                fallback = delta[width*fail[state] + c]
+                if nxt == -1:
+                    delta[width*state + c] = fallback
+                else:
+                    fail[nxt] = fallback
+                    outputs[nxt] += outputs[fallback]
+                    queue.append(nxt)
+
+        self._delta = delta
+        self._outputs = outputs
+
+    def __len__(self):
+        return len(self.motifs)
+
+    @property
+    def n_states(self):
+        return len(self._outputs)
+
+    def reset(self):
+        """Forget the sequence fed so far."""
+        self._state = 0
+        self._fed = 0
+
+    def feed(self, chunk):
+        """Return the (motif, 0-based start) pairs, in the whole stream, of matches ending in chunk."""
+        delta, outputs, motifs = self._delta, self._outputs, self.motifs
+        state, offset = self._state, self._fed + 1
+        matches = []
+        for i, c in enumerate(chunk.encode("ascii").translate(_CODES)):
+            if c == _OTHER:
+                state = 0
+                continue
+            state = delta[4*state + c]
+            for k in outputs[state]:
+                matches.append((motifs[k], offset + i - len(motifs[k])))
+        self._state = state
+        self._fed += len(chunk)
+        return matches
+
+    def finditer(self, sequence, chunk_size=1 << 16):
+        """Yield (motif, 0-based start) for every occurrence of every motif.
+
+        sequence can be a string or an iterable of string chunks. The matcher
+        state of this object is not touched.
+        """
+        chunks = sequence
+        if isinstance(sequence, str):
+            chunks = (sequence[i:i + chunk_size] for i in range(0, len(sequence), chunk_size))
+        stream = copy.copy(self)
+        stream.reset()
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+
+def scan_fasta(motifs, file):
+    """Yield (header, motif, 0-based start) for every motif hit in every record of a FASTA file."""
+    if not isinstance(motifs, MotifSet):
+        motifs = MotifSet(motifs)
+    for header, dna in iter_fasta(file):
+        for motif, pos in motifs.finditer(dna):
+            yield header, motif, pos
+
+if __name__ == "__main__":
+    motifs = MotifSet(["ATAT", "TAT", "GCA", "CTT"])
+    print(sorted(motifs.finditer("GATATATGCATATACTTATAT"), key=lambda hit: hit[1]))
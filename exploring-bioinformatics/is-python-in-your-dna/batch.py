@@ -0,0 +1,116 @@
+"""
+Run one of the Rosalind solvers over many input files with a process pool.
+
+Example:
+    python batch.py consensus "inps/rosalind_cons*.txt" --out outs --workers 4
+"""
+
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from consensus import display, profile_np
+from dna_motif import find
+from kmp import failure
+from random_strings import gc_probs, prob_matrix
+from utils import read_fasta, list_to_string
+
+def solve_consensus(file):
+    symbols = "ACGT"
+    return display(symbols, *profile_np(symbols, read_fasta(file)))
+
+def solve_subs(file):
+    with open(file) as f:
+        string, motif = f.read().split()
+    return list_to_string(find(string, motif))
+
+def solve_kmp(file):
+    return list_to_string(failure(read_fasta(file)[0]))
+
+def solve_prob(file):
+    with open(file) as f:
+        dna, floats = f.read().split("\n")[:2]
+    probs = prob_matrix([dna], gc_probs(map(float, floats.split())))[0]
+    return list_to_string(probs.round(3))
+
+SOLVERS = {
+    "consensus": solve_consensus,
+    "subs": solve_subs,
+    "kmp": solve_kmp,
+    "prob": solve_prob,
+}
+
+def expand_inputs(patterns):
+    """Input files given as directories or glob patterns, in a stable order.
+
+    Outputs are named after the input files, so two inputs with the same
+    file name in different directories are an error.
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*")
+        files.extend(path for path in glob.glob(pattern) if os.path.isfile(path))
+    files = sorted(set(files))
+
+    seen = {}
+    for file in files:
+        other = seen.setdefault(os.path.basename(file), file)
+        if other != file:
+            raise ValueError(f"Inputs {other!r} and {file!r} would write the same output file.")
+    return files
+
+def run_one(solver, file, out_dir):
+    """Solve one file, write its output and return (file, seconds, bytes read)."""
+    start = time.perf_counter()
+    out = SOLVERS[solver](file)
+    with open(os.path.join(out_dir, os.path.basename(file)), "w") as f:
+        f.write(out)
+    return file, time.perf_counter() - start, os.path.getsize(file)
+
+def run_batch(solver, files, out_dir, workers=None, max_pending=None):
+    """Solve all files in a process pool and return the (file, seconds, bytes) of each.
+
+    At most max_pending files are in flight at once, which also bounds the
+    number of output files being written concurrently.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver!r}, pick one of {list(SOLVERS)}.")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2*workers
+
+    results = []
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for file in files:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            pending.add(pool.submit(run_one, solver, file, out_dir))
+        results.extend(future.result() for future in wait(pending).done)
+    return results
+
+def report(results, elapsed):
+    for file, seconds, size in sorted(results):
+        print(f"{file}: {1000*seconds:.1f} ms, {size} bytes")
+    total_bytes = sum(size for _, _, size in results)
+    print(
+        f"{len(results)} files in {elapsed:.2f} s: "
+        f"{len(results)/elapsed:.1f} files/s, {total_bytes/elapsed/1e6:.2f} MB/s"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("solver", choices=list(SOLVERS))
+    parser.add_argument("inputs", nargs="+", help="input directories or glob patterns")
+    parser.add_argument("--out", default="outs", help="directory for the output files")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--max-pending", type=int, default=None, help="files in flight at once")
+    args = parser.parse_args()
+
+    files = expand_inputs(args.inputs)
+    start = time.perf_counter()
+    results = run_batch(args.solver, files, args.out, args.workers, args.max_pending)
+    report(results, time.perf_counter() - start)
@@ -3,7 +3,8 @@ Example solution to "Consensus and Profile", from rosalind.info.
 """
 
 from collections import Counter
-from utils import read_fasta, list_to_string
+import numpy as np
+from utils import iter_fasta, read_fasta, list_to_string
 
 def profile(symbols, dnas):
     length = len(dnas[0])
@@ -20,6 +21,117 @@ def profile(symbols, dnas):
         consensus += letter
     return consensus, profile
 
+def _encoding_table(symbols):
+    """Translation table mapping each byte to the index of its symbol, or 255."""
+    table = bytearray([255]*256)
+    for i, symb in enumerate(symbols):
+        table[ord(symb)] = i
+    return bytes(table)
+
+def encode(symbols, dnas):
+    """Encode equal-length DNA strings as a uint8 matrix of symbol indices."""
+    raw = "".join(dnas).encode("ascii").translate(_encoding_table(symbols))
+    return np.frombuffer(raw, dtype=np.uint8).reshape(len(dnas), -1)
+
+# Sequence bytes encoded at once; each chunk takes about three times this
+# much extra memory, however the bytes are split into rows and columns.
+CHUNK_BYTES = 1 << 24
+
+class ProfileAccumulator:
+    """Running profile of DNA strings that are folded in one batch at a time.
+
+    Only the 4×L counts (and the row where each symbol first shows up in each
+    column, used to break ties like `profile`) are kept in memory, so shards of
+    an alignment can be profiled separately and merged afterwards.
+    """
+    _NEVER = np.iinfo(np.int64).max
+
+    def __init__(self, symbols, length=None):
+        self.symbols = symbols
+        self.length = length
+        self.n = 0
+        self._counts = self._first = None
+        if length is not None:
+            self._allocate(length)
+
+    def _allocate(self, length):
+        self.length = length
+        self._counts = np.zeros((len(self.symbols), length), dtype=np.int64)
+        self._first = np.full((len(self.symbols), length), self._NEVER, dtype=np.int64)
+
+    def update(self, dnas, chunk_bytes=CHUNK_BYTES):
+        """Fold a batch of DNA strings into the profile, about chunk_bytes bases at a time."""
+        if not dnas:
+            return self
+        if self.length is None:
+            self._allocate(len(dnas[0]))
+        if any(len(dna) != self.length for dna in dnas):
+            raise ValueError("All DNA strings must have the same length.")
+
+        rows = max(1, chunk_bytes // max(1, self.length))
+        for start in range(0, len(dnas), rows):
+            self._update_chunk(dnas[start:start + rows])
+        return self
+
+    def _update_chunk(self, dnas):
+        matrix = encode(self.symbols, dnas)
+        for j in range(len(self.symbols)):
+            hits = matrix == j
+            self._counts[j] += np.count_nonzero(hits, axis=0)
+            found = hits.any(axis=0) & (self._first[j] == self._NEVER)
+            self._first[j, found] = self.n + hits[:, found].argmax(axis=0)
+        self.n += len(dnas)
+
+    def add(self, dna):
+        """Fold a single DNA string into the profile."""
+        return self.update([dna])
+
+    def merge(self, other):
+        """Fold in the profile of the DNA strings that come after these ones."""
+        if other.symbols != self.symbols:
+            raise ValueError("Profiles should use the same symbols.")
+        if other.length is None:
+            return self
+        if self.length is None:
+            self._allocate(other.length)
+        if other.length != self.length:
+            raise ValueError("Profiles should have the same length.")
+
+        self._counts += other._counts
+        shifted = np.where(other._first == self._NEVER, self._NEVER, other._first + self.n)
+        np.minimum(self._first, shifted, out=self._first)
+        self.n += other.n
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def result(self):
+        """Return the consensus string and the profile, like `profile` does."""
+        if self.length is None:
+            raise ValueError("The profile is empty.")
+        tied = self._counts == self._counts.max(axis=0)
+        best = np.where(tied, self._first, self._NEVER).argmin(axis=0)
+        letters = np.frombuffer(self.symbols.encode("ascii"), dtype=np.uint8)
+        consensus = letters[best].tobytes().decode("ascii")
+        return consensus, self._counts.tolist()
+
+def profile_np(symbols, dnas, chunk_bytes=CHUNK_BYTES):
+    """Vectorized version of `profile` that encodes about chunk_bytes bases at a time."""
+    return ProfileAccumulator(symbols, len(dnas[0])).update(dnas, chunk_bytes).result()
+
+def profile_fasta(symbols, file, chunk_bytes=CHUNK_BYTES):
+    """Profile the records of a FASTA file, holding about chunk_bytes bases at a time."""
+    acc = ProfileAccumulator(symbols)
+    batch, size = [], 0
+    for _, dna in iter_fasta(file):
+        batch.append(dna)
+        size += len(dna)
+        if size >= chunk_bytes:
+            acc.update(batch, chunk_bytes)
+            batch, size = [], 0
+    return acc.update(batch, chunk_bytes)
+
 def display(symbols, consensus, profile):
     s = consensus + "\n"
     for symb, counts in zip(symbols, profile):
@@ -43,6 +155,6 @@ if __name__ == "__main__":
 
     dnas = read_fasta("inps/rosalind_cons.txt")
     print(dnas)
-    s = display(symbols, *profile(symbols, dnas))
+    s = display(symbols, *profile_np(symbols, dnas))
     with open("outs/rosalind_cons.txt", "w") as f:
         f.write(s)
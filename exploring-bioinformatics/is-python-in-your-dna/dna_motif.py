@@ -2,15 +2,58 @@
 Example solution to "Finding a Motif in DNA", from rosalind.info.
 """
 
+from kmp import Pattern
 from utils import list_to_string
 
-def find(string, motif):
+def _naive(string, motif):
     pos = []
     for i in range(len(string) - len(motif) + 1):
-        if string[i:].startswith(motif):
+        if string.startswith(motif, i):
             pos.append(i+1)
     return pos
 
+def _str_find(string, motif):
+    """Let str.find jump from one match to the next."""
+    pos = []
+    i = string.find(motif)
+    while i != -1:
+        pos.append(i+1)
+        i = string.find(motif, i+1)
+    return pos
+
+def _kmp(string, motif):
+    """Knuth-Morris-Pratt: never moves backwards in the string."""
+    return [i+1 for i in Pattern(motif).finditer(string)]
+
+def _horspool(string, motif):
+    """Boyer-Moore-Horspool: skips ahead based on the last character of the window."""
+    m = len(motif)
+    shift = {char: m - 1 - i for i, char in enumerate(motif[:-1])}
+    pos = []
+    i = 0
+    while i <= len(string) - m:
+        if string.startswith(motif, i):
+            pos.append(i+1)
+        i += shift.get(string[i + m - 1], m)
+    return pos
+
+ENGINES = {
+    "naive": _naive,
+    "find": _str_find,
+    "kmp": _kmp,
+    "horspool": _horspool,
+}
+
+def find(string, motif, engine="find"):
+    """1-based positions of all, possibly overlapping, occurrences of motif in string."""
+    if not motif:
+        return list(range(1, len(string) + 2))
+    try:
+        search = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown engine {engine!r}, pick one of {list(ENGINES)}.") from None
+    return search(string, motif)
+
 if __name__ == "__main__":
     print(find("GATATATGCATATACTTATAT", "ATAT"))
 
@@ -0,0 +1,124 @@
+"""
+faidx-style indexes for random access to the records of a FASTA file.
+"""
+
+import mmap
+import os
+from collections import namedtuple
+
+# Same columns as the .fai files written by `samtools faidx`.
+FaiEntry = namedtuple("FaiEntry", ["name", "length", "offset", "line_bases", "line_width"])
+
+def index_path(file):
+    """Default location of the index of a FASTA file."""
+    return os.fspath(file) + ".fai"
+
+def _scan(f):
+    """Yield a FaiEntry for every record of a FASTA file opened in binary mode."""
+    name = None
+    names = set()
+    pos = 0
+    for line in f:
+        width = len(line)
+        if line.startswith(b">"):
+            if name is not None:
+                yield FaiEntry(name, length, offset, line_bases or 0, line_width or 0)
+            # Like samtools, records are keyed by the first word of the header.
+            name = (line[1:].split() or [b""])[0].decode()
+            if name in names:
+                raise ValueError(f"Duplicate record name {name!r}.")
+            names.add(name)
+            offset = pos + width
+            length = 0
+            line_bases = line_width = None
+            short_line_seen = False
+        elif name is not None:
+            bases = len(line.rstrip(b"\r\n"))
+            if short_line_seen and bases:
+                raise ValueError(f"Record {name!r} has lines of different lengths.")
+            if line_bases is None:
+                line_bases, line_width = bases, width
+            elif bases > line_bases:
+                raise ValueError(f"Record {name!r} has lines of different lengths.")
+            # Only the last line of a record may be shorter than the others.
+            short_line_seen = (bases, width) != (line_bases, line_width)
+            length += bases
+        pos += width
+    if name is not None:
+        yield FaiEntry(name, length, offset, line_bases or 0, line_width or 0)
+
+def build_index(file, index_file=None):
+    """Write the sidecar index of a FASTA file and return its entries."""
+    with open(file, "rb") as f:
+        entries = list(_scan(f))
+    with open(index_file or index_path(file), "w") as f:
+        for entry in entries:
+            f.write("\t".join(map(str, entry)) + "\n")
+    return entries
+
+def load_index(index_file):
+    """Read the entries of a sidecar index, keyed by record name."""
+    index = {}
+    with open(index_file) as f:
+        for line in f:
+            name, *fields = line.rstrip("\n").split("\t")
+            if name in index:
+                raise ValueError(f"Duplicate record name {name!r} in {index_file}.")
+            index[name] = FaiEntry(name, *map(int, fields))
+    return index
+
+
+class IndexedFasta:
+    """Memory-mapped FASTA file that reads records and slices through its index.
+
+    Only the bytes of the requested slice are touched, so a lookup costs
+    O(end - start) no matter how large the file is.
+    """
+    def __init__(self, file, index_file=None):
+        index_file = index_file or index_path(file)
+        if not os.path.exists(index_file) or os.path.getmtime(index_file) < os.path.getmtime(file):
+            build_index(file, index_file)
+        self._index = load_index(index_file)
+
+        self._file = open(file, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __getitem__(self, name):
+        return self.fetch(name)
+
+    @property
+    def names(self):
+        return list(self._index)
+
+    def length(self, name):
+        return self._index[name].length
+
+    def _byte_offset(self, entry, pos):
+        """Position in the file of the pos-th base of a record."""
+        lines, col = divmod(pos, entry.line_bases)
+        return entry.offset + lines*entry.line_width + col
+
+    def fetch(self, name, start=0, end=None):
+        """Return the bases in [start:end] of the given record as a string."""
+        entry = self._index[name]
+        start, end, _ = slice(start, end).indices(entry.length)
+        if start >= end:
+            return ""
+        raw = self._mm[self._byte_offset(entry, start):self._byte_offset(entry, end)]
+        return raw.translate(None, b"\r\n").decode("ascii")
@@ -0,0 +1,139 @@
+"""
+Suffix array and FM-index of a fixed reference, for many motif queries.
+"""
+
+import json
+import os
+from itertools import islice
+import numpy as np
+from utils import iter_fasta
+
+# Code 0 is the end-of-text sentinel; anything that is not a base (like N)
+# gets its own code so that it never matches a motif.
+ALPHABET = "ACGT"
+_OTHER = len(ALPHABET) + 1
+_CODES = bytearray([_OTHER]*256)
+for _code, _symb in enumerate(ALPHABET, start=1):
+    _CODES[ord(_symb)] = _CODES[ord(_symb.lower())] = _code
+_CODES = bytes(_CODES)
+
+def _encode(dna):
+    return np.frombuffer(dna.encode("ascii").translate(_CODES), dtype=np.uint8)
+
+def suffix_array(codes):
+    """Suffix array of a code array by prefix doubling, in O(n log² n)."""
+    n = len(codes)
+    rank = codes.astype(np.int64)
+    k = 1
+    while True:
+        # Sort by the rank of the first k symbols, then by the rank of the next k.
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        changed = (rank[sa][1:] != rank[sa][:-1]) | (second[sa][1:] != second[sa][:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.concatenate(([0], np.cumsum(changed)))
+        if rank.max() == n - 1 or k >= n:
+            return sa
+        k *= 2
+
+
+class FMIndex:
+    """FM-index of one DNA sequence, with the full suffix array to locate hits.
+
+    Counting the occurrences of a motif takes O(len(motif)) rank queries and
+    locating them O(number of hits) more. Indexes can be saved to a directory
+    of .npy files and loaded back memory-mapped, so several worker processes
+    share a single copy of the arrays through the page cache.
+    """
+    _ARRAYS = ("sa", "bwt", "occ", "counts")
+
+    def __init__(self, sa, bwt, occ, counts, step, name=""):
+        self.sa = sa
+        self.bwt = bwt
+        self.occ = occ
+        self.counts = counts
+        self.step = step
+        self.name = name
+
+    @classmethod
+    def from_sequence(cls, dna, name="", step=64):
+        """Build the index of a DNA string, sampling rank counts every step characters."""
+        codes = np.append(_encode(dna), np.uint8(0))
+        sa = suffix_array(codes)
+        sa = sa.astype(np.int32 if len(codes) < 2**31 else np.int64)
+        bwt = codes[sa - 1]     # sa - 1 == -1 wraps around to the sentinel.
+
+        n_codes = _OTHER + 1
+        # occ[j, c] is the number of times code c shows up in bwt[:j*step].
+        n_blocks = len(bwt) // step
+        blocks = bwt[:n_blocks*step].reshape(n_blocks, step)
+        occ = np.zeros((n_blocks + 1, n_codes), dtype=np.int64)
+        for code in range(n_codes):
+            np.cumsum(np.count_nonzero(blocks == code, axis=1), out=occ[1:, code])
+        # counts[c] is the number of codes smaller than c in the text.
+        counts = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=n_codes))))
+        return cls(sa, bwt, occ, counts, step, name)
+
+    @classmethod
+    def from_fasta(cls, file, record=0, step=64):
+        """Build the index of the given record of a FASTA file."""
+        header, dna = next(islice(iter_fasta(file), record, None))
+        return cls.from_sequence(dna, header, step)
+
+    def save(self, path):
+        """Save the index as a directory of .npy files."""
+        os.makedirs(path, exist_ok=True)
+        for attr in self._ARRAYS:
+            np.save(os.path.join(path, attr + ".npy"), getattr(self, attr))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"name": self.name, "step": self.step}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Load an index saved with `save`, memory-mapping its arrays by default."""
+        arrays = [
+            np.load(os.path.join(path, attr + ".npy"), mmap_mode=mmap_mode)
+            for attr in cls._ARRAYS
+        ]
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(*arrays, meta["step"], meta["name"])
+
+    def __len__(self):
+        """Length of the indexed sequence."""
+        return len(self.bwt) - 1
+
+    def _rank(self, code, i):
+        """Number of times code shows up in bwt[:i]."""
+        block = i // self.step
+        start = block*self.step
+        return int(self.occ[block, code]) + int(np.count_nonzero(self.bwt[start:i] == code))
+
+    def _interval(self, motif):
+        """Range of suffix array rows of the suffixes that start with motif."""
+        if not motif:
+            raise ValueError("The motif must not be empty.")
+        lo, hi = 0, len(self.bwt)
+        for code in reversed(_encode(motif)):
+            if code == _OTHER:
+                return 0, 0
+            lo = int(self.counts[code]) + self._rank(code, lo)
+            hi = int(self.counts[code]) + self._rank(code, hi)
+            if lo >= hi:
+                return 0, 0
+        return lo, hi
+
+    def count(self, motif):
+        """Number of occurrences of motif in the sequence."""
+        lo, hi = self._interval(motif)
+        return hi - lo
+
+    def locate(self, motif):
+        """Sorted 0-based starting positions of all occurrences of motif."""
+        lo, hi = self._interval(motif)
+        return np.sort(self.sa[lo:hi]).tolist()
+
+if __name__ == "__main__":
+    index = FMIndex.from_sequence("GATATATGCATATACTTATAT")
+    print([pos + 1 for pos in index.locate("ATAT")])
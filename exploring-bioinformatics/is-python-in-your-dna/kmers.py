@@ -0,0 +1,153 @@
+"""
+Count k-mers with 2-bit rolling codes instead of string slices.
+"""
+
+import numpy as np
+from packed import ALPHABET, PackedDNA
+from utils import iter_fasta
+
+# Above this k a dense table of 4**k counters gets too big and a sorted
+# table of the k-mers actually seen is used instead. At k=10 the table is
+# 8 MiB, small enough to send back from a worker process for merging.
+MAX_DENSE_K = 10
+# K-mer codes are buffered and only added to the table once this many are
+# pending, so the table is not rebuilt (sparse) or swept (dense) per record.
+COMPACT_AT = 1 << 22
+
+def decode(code, k):
+    """The k-mer string with the given 2-bit code."""
+    code = int(code)
+    return "".join(ALPHABET[(code >> 2*(k - 1 - i)) & 3] for i in range(k))
+
+def encode(kmer):
+    """The 2-bit code of a k-mer string."""
+    code = 0
+    for symb in kmer:
+        code = (code << 2) | ALPHABET.index(symb)
+    return code
+
+def _merge_sorted(keys, counts):
+    """Sort the keys and add up the counts of equal keys."""
+    order = np.argsort(keys, kind="stable")
+    keys, counts = keys[order], counts[order]
+    if not len(keys):
+        return keys, counts
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+class KmerCounter:
+    """Counts of all k-mers (k up to 31) seen in a set of DNA sequences.
+
+    For small k the counts live in a dense array indexed by k-mer code, for
+    larger k in a sorted (codes, counts) table. K-mers with ambiguous bases
+    are skipped. Counters of the same k can be merged, so sequences can be
+    counted in separate processes and combined afterwards.
+    """
+    def __init__(self, k, dense=None):
+        if not 1 <= k <= 31:
+            raise ValueError("k must be between 1 and 31.")
+        self.k = k
+        self.dense = k <= MAX_DENSE_K if dense is None else dense
+        if self.dense:
+            self._counts = np.zeros(4**k, dtype=np.int64)
+        else:
+            self._keys = np.zeros(0, dtype=np.uint64)
+            self._counts = np.zeros(0, dtype=np.int64)
+        self._pending = []
+        self._n_pending = 0
+
+    def update(self, dna):
+        """Count the k-mers of a str or PackedDNA sequence."""
+        if not isinstance(dna, PackedDNA):
+            dna = PackedDNA(dna)
+        codes, valid = dna.kmers(self.k)
+        self._pending.append(codes[valid])
+        self._n_pending += len(self._pending[-1])
+        if self._n_pending >= COMPACT_AT:
+            self._compact()
+        return self
+
+    def _compact(self):
+        """Add the buffered codes to the table."""
+        if not self._pending:
+            return
+        codes = np.concatenate(self._pending)
+        self._pending = []
+        self._n_pending = 0
+        if self.dense and len(codes) >= len(self._counts):
+            self._counts += np.bincount(codes.astype(np.int64), minlength=len(self._counts))
+            return
+        codes, counts = np.unique(codes, return_counts=True)
+        if self.dense:
+            self._counts[codes.astype(np.int64)] += counts
+        else:
+            self._add_sparse(codes, counts)
+
+    def _add_sparse(self, keys, counts):
+        self._keys, self._counts = _merge_sorted(
+            np.concatenate((self._keys, keys)),
+            np.concatenate((self._counts, counts)),
+        )
+
+    def merge(self, other):
+        """Add the counts of another counter with the same k."""
+        if other.k != self.k:
+            raise ValueError("Counters should have the same k.")
+        self._compact()
+        other._compact()
+        if self.dense and other.dense:
+            self._counts += other._counts
+        elif self.dense:
+            np.add.at(self._counts, other._keys.astype(np.int64), other._counts)
+        else:
+            self._add_sparse(*other.items())
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def items(self):
+        """Sorted codes of the k-mers seen, and their counts."""
+        self._compact()
+        if self.dense:
+            codes = np.flatnonzero(self._counts)
+            return codes.astype(np.uint64), self._counts[codes]
+        return self._keys, self._counts
+
+    def __getitem__(self, kmer):
+        code = encode(kmer)
+        self._compact()
+        if self.dense:
+            return int(self._counts[code])
+        i = np.searchsorted(self._keys, np.uint64(code))
+        found = i < len(self._keys) and self._keys[i] == code
+        return int(self._counts[i]) if found else 0
+
+    def total(self):
+        """Number of k-mers counted."""
+        self._compact()
+        return int(self._counts.sum())
+
+    def most_common(self, n=None):
+        """List the n most common k-mers and their counts, like Counter.most_common."""
+        codes, counts = self.items()
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [(decode(code, self.k), int(count)) for code, count in zip(codes[order], counts[order])]
+
+    def spectrum(self):
+        """Array whose m-th entry is the number of distinct k-mers seen m times."""
+        _, counts = self.items()
+        return np.bincount(counts)
+
+def count_fasta(file, k, dense=None):
+    """Count the k-mers of every record of a FASTA file, one record at a time."""
+    counter = KmerCounter(k, dense)
+    for _, dna in iter_fasta(file):
+        counter.update(dna)
+    return counter
+
+if __name__ == "__main__":
+    counter = count_fasta("inps/rosalind_cons.txt", 4)
+    print(counter.most_common(5))
+    print(counter.spectrum())
@@ -2,40 +2,84 @@
 Example solution to "Speeding Up Motif Finding", from rosalind.info.
 """
 
+import copy
 from utils import read_fasta, list_to_string
 
 def failure(s):
-    r = [0]
-    for k in range(1, len(s)):
-        sub = s[:k+1]
-        prefix = sub[:r[-1]+1]
-        while not sub.endswith(prefix):
-            prefix = prefix[:-1]
-        r.append(len(prefix))
-
+    """Length of the longest proper prefix of s[:k+1] that is also its suffix, for each k."""
+    r = [0]*len(s)
+    k = 0
+    for i in range(1, len(s)):
+        # Fall back through the borders of s[:i] until one can be extended.
+        while k and s[i] != s[k]:
+            k = r[k-1]
+        if s[i] == s[k]:
+            k += 1
+        r[i] = k
     return r
 
+class Pattern:
+    """A pattern with its failure table built once, ready to be searched for.
+
+    The matcher state is kept between calls to `feed`, so a text can be
+    streamed in chunks and matches that straddle chunk boundaries are found.
+    """
+    def __init__(self, pattern):
+        if not pattern:
+            raise ValueError("The pattern must not be empty.")
+        self.pattern = pattern
+        self.fail = failure(pattern)
+        self.reset()
+
+    def reset(self):
+        """Forget the text fed so far."""
+        # Number of pattern characters currently matched, and characters fed.
+        self._j = 0
+        self._fed = 0
+
+    def feed(self, chunk):
+        """Return the 0-based starting positions, in the whole stream, of matches ending in chunk."""
+        pattern, fail, m = self.pattern, self.fail, len(self.pattern)
+        j, offset = self._j, self._fed - m + 1
+        matches = []
+        for i, char in enumerate(chunk):
+            while j and char != pattern[j]:
+                j = fail[j-1]
+            if char == pattern[j]:
+                j += 1
+            if j == m:
+                matches.append(offset + i)
+                j = fail[j-1]
+        self._j = j
+        self._fed += len(chunk)
+        return matches
+
+    def finditer(self, text, chunk_size=1 << 16):
+        """Yield the 0-based starting positions of all matches in text.
+
+        text can be a string or an iterable of string chunks. The matcher
+        state of this pattern is not touched.
+        """
+        chunks = text
+        if isinstance(text, str):
+            chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+        stream = copy.copy(self)
+        stream.reset()
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+
 def kmp(pattern, s):
-    fail = failure(pattern)
-    # i points to the character in s we are currently trying to match.
-    # j points to the character in pattern we are currently trying to match.
-    i = j = 0
-    while i < len(s) and j < len(pattern):
-        if s[i] == pattern[j]:
-            i, j = i + 1, j + 1
-        elif j > 0:
-            j = fail[j-1]
-        else:
-            i += 1
-    if j == len(pattern):
+    found = False
+    for i in Pattern(pattern).finditer(s):
         print("Pattern found at i = ", str(i))
-    else:
+        found = True
+    if not found:
         print("None :'(")
 
 if __name__ == "__main__":
     print(failure("CAGCATGGTATCACAGCAGAG"))
 
     kmp("ABCDABD", "ABC ABCDAB ABCDABCDABDE")
-    # data = read_fasta("inps/rosalind_kmp.txt")[0]
-    # with open("outs/rosalind_kmp.txt", "w") as f:
-    #     f.write(list_to_string(failure(data)))
+    data = read_fasta("inps/rosalind_kmp.txt")[0]
+    with open("outs/rosalind_kmp.txt", "w") as f:
+        f.write(list_to_string(failure(data)))
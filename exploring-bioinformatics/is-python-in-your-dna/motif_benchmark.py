@@ -0,0 +1,48 @@
+"""
+Compare the search engines of dna_motif.find on a long synthetic DNA string.
+"""
+
+import argparse
+import random
+import time
+from dna_motif import ENGINES, find
+
+def random_dna(size, seed=0):
+    """Uniformly random DNA string with the given number of bases."""
+    table = bytes(b"ACGT"[i % 4] for i in range(256))
+    return random.Random(seed).randbytes(size).translate(table).decode("ascii")
+
+def benchmark(string, motifs, engines):
+    """Time every engine on every motif and check that they all agree."""
+    results = []
+    for motif in motifs:
+        expected = None
+        for engine in engines:
+            start = time.perf_counter()
+            pos = find(string, motif, engine)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = pos
+            elif pos != expected:
+                raise RuntimeError(f"Engine {engine!r} disagrees on motif {motif!r}.")
+            results.append((motif, engine, len(pos), elapsed))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100_000_000, help="number of bases")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.size:,} random bases...")
+    string = random_dna(args.size, args.seed)
+    motifs = [
+        string[args.size // 2:args.size // 2 + 8],     # Short motif, many hits.
+        string[args.size // 3:args.size // 3 + 32],    # Long motif, few hits.
+        "ATATATATATATATAT",                            # Periodic motif.
+    ]
+
+    print(f"{'motif':>32} {'engine':>9} {'hits':>9} {'seconds':>9} {'MB/s':>9}")
+    for motif, engine, hits, elapsed in benchmark(string, motifs, args.engines):
+        print(f"{motif:>32} {engine:>9} {hits:>9} {elapsed:>9.3f} {args.size/elapsed/1e6:>9.1f}")
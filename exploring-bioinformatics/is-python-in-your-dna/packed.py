@@ -0,0 +1,128 @@
+"""
+Compact DNA sequences stored with 2 bits per base.
+"""
+
+import numpy as np
+
+ALPHABET = "ACGT"
+# Every symbol that is not one of ACGT is an ambiguity code and decodes to N.
+_AMBIGUOUS = len(ALPHABET)
+_CODES = bytearray([_AMBIGUOUS]*256)
+for _code, _symb in enumerate(ALPHABET):
+    _CODES[ord(_symb)] = _CODES[ord(_symb.lower())] = _code
+_CODES = bytes(_CODES)
+_LETTERS = np.frombuffer(ALPHABET.encode("ascii"), dtype=np.uint8)
+
+def _runs(mask):
+    """(start, end) pairs of the runs of True values of a boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).view(np.int8)))
+    return edges.reshape(-1, 2).astype(np.int64)
+
+
+class PackedDNA:
+    """DNA sequence that uses 2 bits per base, about a quarter of a str.
+
+    Base i lives in bits 2*(i%4) and 2*(i%4)+1 of byte i//4. Positions of
+    ambiguous bases (N and friends) are kept on the side as runs, which is
+    compact because they usually come in long stretches. Slicing returns a
+    view over the same buffer.
+    """
+    def __init__(self, dna=""):
+        raw = np.frombuffer(dna.encode("ascii").translate(_CODES), dtype=np.uint8)
+        ambiguous = raw == _AMBIGUOUS
+        self._init_from_codes(np.where(ambiguous, 0, raw), _runs(ambiguous))
+
+    def _init_from_codes(self, codes, n_runs):
+        padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+        padded[:len(codes)] = codes
+        quads = padded.reshape(-1, 4)
+        self._data = quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+        self._n_runs = n_runs
+        self._start = 0
+        self._len = len(codes)
+
+    @classmethod
+    def _from_codes(cls, codes, n_runs):
+        obj = cls.__new__(cls)
+        obj._init_from_codes(codes, n_runs)
+        return obj
+
+    @property
+    def nbytes(self):
+        """Bytes used by the buffers behind this sequence (shared with its views)."""
+        return self._data.nbytes + self._n_runs.nbytes
+
+    def __len__(self):
+        return self._len
+
+    def codes(self):
+        """2-bit code (A=0, C=1, G=2, T=3) of every base, with ambiguous bases as 0."""
+        block = self._data[self._start >> 2:(self._start + self._len + 3) >> 2]
+        unpacked = np.empty((len(block), 4), dtype=np.uint8)
+        for i in range(4):
+            np.bitwise_and(block >> (2*i), 3, out=unpacked[:, i])
+        skip = self._start & 3
+        return unpacked.ravel()[skip:skip + self._len]
+
+    def ambiguous(self):
+        """Boolean mask of the ambiguous bases."""
+        mask = np.zeros(self._len, dtype=bool)
+        for start, end in self._local_runs():
+            mask[start:end] = True
+        return mask
+
+    def _local_runs(self):
+        """Runs of ambiguous bases that overlap this view, in view coordinates."""
+        stop = self._start + self._len
+        lo = np.searchsorted(self._n_runs[:, 1], self._start, side="right")
+        hi = np.searchsorted(self._n_runs[:, 0], stop, side="left")
+        return np.clip(self._n_runs[lo:hi], self._start, stop) - self._start
+
+    def __str__(self):
+        letters = _LETTERS[self.codes()]
+        letters[self.ambiguous()] = ord("N")
+        return letters.tobytes().decode("ascii")
+
+    def __repr__(self):
+        s = str(self[:20]) + ("..." if self._len > 20 else "")
+        return f"{type(self).__name__}({s!r}, length={self._len})"
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._len)
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported.")
+            view = object.__new__(type(self))
+            view._data = self._data
+            view._n_runs = self._n_runs
+            view._start = self._start + start
+            view._len = max(0, stop - start)
+            return view
+
+        if key < 0:
+            key += self._len
+        if not 0 <= key < self._len:
+            raise IndexError("PackedDNA index out of range")
+        return str(self[key:key + 1])
+
+    def reverse_complement(self):
+        """New sequence with the reverse complement of this one."""
+        runs = self._len - self._local_runs()[::-1, ::-1]
+        return self._from_codes(3 - self.codes()[::-1], runs)
+
+    def kmers(self, k):
+        """2k-bit integer code of every k-mer, and whether it is free of ambiguous bases.
+
+        The code of the k-mer starting at i is the base-4 number whose digits
+        are the codes of its bases, the first base being the most significant.
+        """
+        if not 1 <= k <= 31:
+            raise ValueError("k must be between 1 and 31.")
+        n = max(0, self._len - k + 1)
+        codes = self.codes().astype(np.uint64)
+        kmers = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            kmers = (kmers << np.uint64(2)) | codes[j:j + n]
+        ambiguous = np.concatenate(([0], np.cumsum(self.ambiguous())))
+        valid = ambiguous[k:k + n] == ambiguous[:n]
+        return kmers, valid
@@ -3,6 +3,7 @@ Example solution to "Introduction to Random Strings", from rosalind.info.
 """
 
 from math import log10
+import numpy as np
 from utils import list_to_string
 
 def prob(seq, probs):
@@ -12,6 +13,26 @@ def prob(seq, probs):
         acc += log10(probs[symb])
     return acc
 
+def composition(seqs, symbols="ACGT"):
+    """Matrix with the number of times each symbol shows up in each sequence."""
+    counts = np.array([[seq.count(symb) for symb in symbols] for seq in seqs], dtype=np.int64)
+    if (counts.sum(axis=1) != [len(seq) for seq in seqs]).any():
+        raise ValueError(f"Sequences should only contain the symbols {symbols}.")
+    return counts
+
+def prob_matrix(seqs, probs, symbols="ACGT"):
+    """Log10 probabilities of every sequence under every probability dictionary.
+
+    The composition of each sequence is counted once, so scoring k dictionaries
+    costs O(n + k) instead of the O(n*k) of calling `prob` k times.
+    """
+    log_probs = np.log10([[p[symb] for symb in symbols] for p in probs])
+    return composition(seqs, symbols) @ log_probs.T
+
+def gc_probs(gc_contents):
+    """Symbol probabilities for each GC-content value."""
+    return [{"A": (1-gc)/2, "T": (1-gc)/2, "C": gc/2, "G": gc/2} for gc in gc_contents]
+
 if __name__ == "__main__":
     print(prob("ACGATACAA", {"A": 0.871/2, "T": 0.871/2, "C": 0.129/2, "G": 0.129/2}))
 
@@ -20,10 +41,6 @@ if __name__ == "__main__":
     dna = contents[0]
     floats = contents[1]
 
-    probs = []
-    for s in floats.split(" "):
-        f = float(s)
-        p, p_ = f/2, (1-f)/2
-        d = {"A": p_, "T": p_, "C": p, "G": p}
-        probs.append(round(prob(dna, d), 3))
-    print(list_to_string(probs))
+    gcs = [float(s) for s in floats.split(" ")]
+    probs = prob_matrix([dna], gc_probs(gcs))[0]
+    print(list_to_string(np.round(probs, 3)))
@@ -2,26 +2,52 @@
 Utility functions to solve problems from rosalind.info.
 """
 
-def read_fasta(file, remove_headers=True):
-    """Reads DNA strings from a file in FASTA format."""
+from packed import PackedDNA
+
+def _iter_lines(f, chunk_size):
+    """Yield the lines of an open file, reading it chunk_size characters at a time."""
+    partial = []
+    while chunk := f.read(chunk_size):
+        *lines, last = chunk.split("\n")
+        if lines:
+            # Lines longer than a chunk are only joined once they are complete.
+            lines[0] = "".join(partial) + lines[0]
+            partial = []
+            yield from lines
+        partial.append(last)
+    yield "".join(partial)
+
+def iter_fasta(file, chunk_size=1 << 20):
+    """Lazily yield (header, dna) pairs from a file in FASTA format.
+
+    The file is read chunk_size characters at a time and the lines of each
+    record are joined only once, so memory is bounded by the largest record
+    instead of the whole file.
+    """
+    header, pieces = None, []
     with open(file) as f:
-        contents = [line[:-1] for line in f.readlines()]
+        for line in _iter_lines(f, chunk_size):
+            line = line.strip()
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(pieces)
+                header, pieces = line[1:], []
+            elif line:
+                pieces.append(line)
+    if header is not None:
+        yield header, "".join(pieces)
 
-    data = []
-    header = contents[0]
-    dna = ""
-    for line in contents[1:] + [">"]:
-        if line.startswith(">"):
-            if remove_headers:
-                data.append(dna)
-            else:
-                data.append((header, dna))
-            dna = ""
-            header = line[1:]
-        else:
-            dna = dna + line
+def read_fasta(file, remove_headers=True, packed=False):
+    """Reads DNA strings from a file in FASTA format.
 
-    return data
+    With packed=True the sequences are returned as 2-bit PackedDNA objects.
+    """
+    records = iter_fasta(file)
+    if packed:
+        records = ((header, PackedDNA(dna)) for header, dna in records)
+    if remove_headers:
+        return [dna for _, dna in records]
+    return list(records)
 
 def list_to_string(l):
     return " ".join(map(str, l))
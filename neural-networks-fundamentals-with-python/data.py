@@ -0,0 +1,92 @@
+"""
+Shuffled minibatches prepared on a background thread while the network trains.
+"""
+
+import queue
+import threading
+import numpy as np
+
+
+class DataLoader:
+    """Iterate over shuffled minibatches of a dataset with one sample per row.
+
+    inputs can be an in-memory or a memory-mapped array of shape (N, features)
+    and targets, if given, has N rows as well. Each batch is yielded as a pair
+    (x, t) already laid out for NeuralNetwork.train: x has one sample per
+    column and is converted to dtype only when the batch is built, t is a
+    vector of classes or has one column per sample.
+
+    A background thread keeps up to `prefetch` batches ready, so gathering the
+    next batch (most of it NumPy work that releases the GIL) overlaps with the
+    training step on the current one.
+    """
+    def __init__(
+        self, inputs, targets=None, batch_size=32, shuffle=True, dtype=np.float32, prefetch=2, seed=None
+    ):
+        if targets is not None and len(targets) != len(inputs):
+            raise ValueError("inputs and targets should have the same number of rows.")
+        self.inputs = inputs
+        self.targets = targets
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.dtype = dtype
+        self.prefetch = prefetch
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        """Number of batches per epoch."""
+        return -(-len(self.inputs) // self.batch_size)
+
+    def _batch(self, idx):
+        x = np.asarray(self.inputs[idx], dtype=self.dtype).T
+        t = None if self.targets is None else np.asarray(self.targets[idx]).T
+        return x, t
+
+    def _batches(self):
+        n = len(self.inputs)
+        order = self._rng.permutation(n) if self.shuffle else None
+        for start in range(0, n, self.batch_size):
+            if order is None:
+                yield self._batch(slice(start, start + self.batch_size))
+            else:
+                # Sorted indices read memory-mapped rows in file order.
+                yield self._batch(np.sort(order[start:start + self.batch_size]))
+
+    def __iter__(self):
+        if not self.prefetch:
+            yield from self._batches()
+            return
+
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            """Queue item unless the consumer is gone; return whether it was queued."""
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for item in self._batches():
+                    if not put(item):
+                        return
+                put(done)
+            except BaseException as e:
+                put(e)
+
+        worker = threading.Thread(target=produce, daemon=True)
+        worker.start()
+        try:
+            while (item := batches.get()) is not done:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
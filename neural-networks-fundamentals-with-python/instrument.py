@@ -0,0 +1,67 @@
+"""
+Sinks for the Records sent by instrumented layers and networks.
+
+Any callable that takes a Record is a sink, so a plain function works as a
+callback. Example:
+
+    summary = Summary()
+    net.instrument(summary)
+    train(net, train_data)
+    net.instrument(None)
+    print(summary.report())
+"""
+
+import csv
+from nn import Record
+
+
+class Summary:
+    """Keep running totals of the Records of every (name, phase) pair in memory."""
+    def __init__(self):
+        self.totals = {}
+
+    def __call__(self, record):
+        calls, seconds, samples, flops, nbytes = self.totals.get((record.name, record.phase), (0, 0., 0, 0, 0))
+        self.totals[record.name, record.phase] = (
+            calls + 1,
+            seconds + record.seconds,
+            samples + record.samples,
+            flops + (record.flops or 0),
+            nbytes + (record.nbytes or 0),
+        )
+
+    def rows(self):
+        """(name, phase, calls, seconds, samples/s, GFLOP/s, MB allocated) of every pair seen."""
+        rows = []
+        for (name, phase), (calls, seconds, samples, flops, nbytes) in self.totals.items():
+            rate = samples/seconds if seconds else 0.
+            gflops = flops/seconds/1e9 if seconds else 0.
+            rows.append((name, phase, calls, seconds, rate, gflops, nbytes/1e6))
+        return rows
+
+    def report(self):
+        """The rows as a table, slowest first."""
+        lines = [f"{'name':<10} {'phase':<9} {'calls':>8} {'seconds':>9} {'samples/s':>12} {'GFLOP/s':>8} {'MB':>10}"]
+        for name, phase, calls, seconds, rate, gflops, mb in sorted(self.rows(), key=lambda row: -row[3]):
+            lines.append(f"{name:<10} {phase:<9} {calls:>8} {seconds:>9.3f} {rate:>12,.0f} {gflops:>8.2f} {mb:>10.1f}")
+        return "\n".join(lines)
+
+
+class CSVSink:
+    """Write every Record as a row of a CSV file, with a header row first."""
+    def __init__(self, path):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(Record._fields)
+
+    def __call__(self, record):
+        self._writer.writerow(record)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,5 +1,8 @@
 from nn import ReLU, LeakyReLU, Sigmoid, CrossEntropyLoss, Layer, NeuralNetwork
+from data import DataLoader
+from itertools import islice
 import csv
+import os
 import numpy as np
 
 def load_data(filepath, delimiter=",", dtype=float):
@@ -13,38 +16,75 @@ def load_data(filepath, delimiter=",", dtype=float):
     print("Done.")
     return data
 
+def convert_csv(csv_path, npy_path, delimiter=",", dtype=np.uint8, block_rows=1000):
+    """Convert a numerical CSV file into a .npy file, block_rows lines at a time."""
+
+    print(f"Converting {csv_path} to {npy_path}...")
+    with open(csv_path, "r") as f:
+        nrows = sum(1 for _ in f)
+        f.seek(0)
+        ncols = len(f.readline().split(delimiter))
+        f.seek(0)
+
+        # Write next to npy_path and rename at the end, so an interrupted
+        # conversion never leaves a valid-looking .npy file behind.
+        tmp_path = npy_path + ".tmp"
+        try:
+            data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(nrows, ncols))
+            for start in range(0, nrows, block_rows):
+                lines = list(islice(f, block_rows))
+                data[start:start + len(lines)] = np.loadtxt(lines, delimiter=delimiter, dtype=dtype, ndmin=2)
+            data.flush()
+            del data
+            os.replace(tmp_path, npy_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    print("Done.")
+
+def load_binary(filepath):
+    """Memory-map a .npy file read-only, so processes can share its pages."""
+    return np.load(filepath, mmap_mode="r")
+
+def load_mnist(csv_path, delimiter=","):
+    """Load an MNIST CSV file through its uint8 .npy copy, converting it once if needed."""
+    npy_path = os.path.splitext(csv_path)[0] + ".npy"
+    if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(csv_path):
+        convert_csv(csv_path, npy_path, delimiter)
+    return load_binary(npy_path)
+
 def to_col(vec):
     return vec.reshape((vec.size, 1))
 
-def test(net, test_data):
-    correct = 0
-    for i, test_row in enumerate(test_data):
-        if not i%1000:
-            print(i)
-
-        t = test_row[0]
-        x = to_col(test_row[1:])
-        out = net.forward_pass(x)
-        guess = np.argmax(out)
-        if t == guess:
-            correct += 1
-
-    return correct/test_data.shape[0]
-
-def train(net, train_data):
-    # # Precompute all target vectors.
-    # ts = {}
-    # for t in range(10):
-    #     tv = np.zeros((10, 1))
-    #     tv[t] = 1
-    #     ts[t] = tv
-
-    for i, train_row in enumerate(train_data):
-        if not i%1000:
-            print(i)
-
-        t = train_row[0]
-        x = to_col(train_row[1:])
+def test(net, test_data, batch_size=1000):
+    """Fraction of the rows of test_data whose label the network guesses right."""
+    out = net.predict(test_data[:, 1:].T, batch_size)
+    return np.mean(np.argmax(out, axis=0) == test_data[:, 0])
+
+def test_streaming(net, test_data, batch_size=1000):
+    """Same as `test`, but only batch_size rows are in memory at any time.
+
+    test_data can be a (memory-mapped) array or any iterable of row blocks.
+    """
+    blocks = test_data
+    if isinstance(test_data, np.ndarray):
+        blocks = (test_data[i:i + batch_size] for i in range(0, test_data.shape[0], batch_size))
+
+    correct = total = 0
+    for rows in blocks:
+        out = net.forward_pass(rows[:, 1:].T)
+        correct += np.count_nonzero(np.argmax(out, axis=0) == rows[:, 0])
+        total += rows.shape[0]
+    return correct/total
+
+def train(net, train_data, batch_size=32):
+    """Train the network on shuffled minibatches of batch_size rows of train_data."""
+    loader = DataLoader(train_data[:, 1:], train_data[:, 0], batch_size)
+    for i, (x, t) in enumerate(loader):
+        if not i % max(1, 1000 // batch_size):
+            print(i*batch_size)
+
         net.train(x, t)
 
 
@@ -56,12 +96,12 @@ if __name__ == "__main__":
     ]
     net = NeuralNetwork(layers, CrossEntropyLoss(), 0.001)
 
-    test_data = load_data("mnistdata/mnist_test.csv", delimiter=",", dtype=int)
+    test_data = load_mnist("mnistdata/mnist_test.csv")
 
     accuracy = test(net, test_data)
     print(f"Accuracy is {100*accuracy:.2f}%")     # Expected to be around 10%
 
-    train_data = load_data("mnistdata/mnist_train.csv", delimiter=",", dtype=int)
+    train_data = load_mnist("mnistdata/mnist_train.csv")
     train(net, train_data)
 
     accuracy = test(net, test_data)
@@ -1,58 +1,80 @@
+import json
+import time
 import numpy as np
 from abc import ABC, abstractmethod
+from collections import namedtuple
 
 
-def create_weight_matrix(nrows, ncols):
+def create_weight_matrix(nrows, ncols, dtype=np.float64):
     """Create a weight matrix with normally distributed random elements."""
-    return np.random.normal(loc=0, scale=1/(nrows*ncols), size=(nrows, ncols))
+    return np.random.normal(loc=0, scale=1/(nrows*ncols), size=(nrows, ncols)).astype(dtype)
 
-def create_bias_vector(length):
+def create_bias_vector(length, dtype=np.float64):
     """Create a bias vector with normally distributed random elements."""
-    return np.random.normal(loc=0, scale=1/length, size=(length, 1))
+    return np.random.normal(loc=0, scale=1/length, size=(length, 1)).astype(dtype)
 
 
 class ActivationFunction:
     """Class to be inherited by activation functions."""
     @abstractmethod
-    def f(self, x):
-        """The method that implements the function."""
+    def f(self, x, out=None):
+        """The method that implements the function.
+
+        If out is given, the result is written into it instead of a new array.
+        out must have the shape and dtype of x and must not be x itself.
+        """
         pass
 
     @abstractmethod
-    def df(self, x):
-        """Derivative of the function with respect to its input."""
+    def df(self, x, fx=None):
+        """Derivative of the function with respect to its input.
+
+        fx, if given, is f(x) as computed in the forward pass, and lets
+        some functions skip evaluating f again.
+        """
         pass
 
 class Id(ActivationFunction):
-    def f(self, x):
-        return x
+    def f(self, x, out=None):
+        if out is None:
+            return x.copy()
+        np.copyto(out, x)
+        return out
 
-    def df(self, x):
-        return np.ones(x.shape)
+    def df(self, x, fx=None):
+        return np.ones(x.shape, dtype=x.dtype)
 
 class ELU(ActivationFunction):
     """Exponential Linear Unit."""
     def __init__(self, alpha=0.1):
         self.alpha = alpha
 
-    def f(self, x):
-        out = self.alpha*(np.exp(x) - 1)
-        out[x > 0] = x[x > 0]
+    def f(self, x, out=None):
+        # Only the negative branch needs exp, and there it cannot overflow.
+        out = np.minimum(x, 0, out=out, dtype=x.dtype)
+        np.exp(out, out=out)
+        out -= 1
+        out *= self.alpha
+        np.copyto(out, x, where=x > 0)
         return out
 
-    def df(self, x):
-        return np.maximum(x >= 0, self.alpha*(x < 0)*np.exp(x))
+    def df(self, x, fx=None):
+        if fx is None:
+            fx = self.f(x)
+        # For x < 0, alpha*exp(x) == f(x) + alpha.
+        return np.where(x >= 0, 1, fx + self.alpha).astype(x.dtype, copy=False)
 
 class LeakyReLU(ActivationFunction):
     """Leaky Rectified Linear Unit."""
     def __init__(self, leaky_param=0.1):
         self.alpha = leaky_param
 
-    def f(self, x):
-        return np.maximum(x, x*self.alpha)
+    def f(self, x, out=None):
+        out = np.multiply(x, self.alpha, out=out, dtype=x.dtype)
+        return np.maximum(x, out, out=out)
 
-    def df(self, x):
-        return np.maximum(x > 0, self.alpha)
+    def df(self, x, fx=None):
+        return np.maximum(x > 0, self.alpha).astype(x.dtype, copy=False)
 
 class ReLU(LeakyReLU):
     """Leaky ReLU with parameter 0."""
@@ -60,24 +82,33 @@ class ReLU(LeakyReLU):
         super().__init__(0)
 
 class Sigmoid(ActivationFunction):
-    def f(self, x):
-        return 1/(1 + np.exp(-x))
-
-    def df(self, x):
-        return self.f(x) * (1 - self.f(x))
+    def f(self, x, out=None):
+        out = np.negative(x, out=out)
+        # exp overflows past log(max), which is only 88 in float32.
+        np.minimum(out, np.floor(np.log(np.finfo(out.dtype).max)), out=out)
+        np.exp(out, out=out)
+        out += 1
+        return np.reciprocal(out, out=out)
+
+    def df(self, x, fx=None):
+        if fx is None:
+            fx = self.f(x)
+        return fx * (1 - fx)
 
 class Tanh(ActivationFunction):
-    def f(self, x):
-        return np.tanh(x)
+    def f(self, x, out=None):
+        return np.tanh(x, out=out)
 
-    def df(self, x):
-        return 1 - self.f(x)**2
+    def df(self, x, fx=None):
+        if fx is None:
+            fx = self.f(x)
+        return 1 - fx**2
 
 class ArcTan(ActivationFunction):
-    def f(self, x):
-        return np.arctan(x)
+    def f(self, x, out=None):
+        return np.arctan(x, out=out)
 
-    def df(self, x):
+    def df(self, x, fx=None):
         return 1/(1 + x**2)
 
 
@@ -93,6 +124,13 @@ class LossFunction:
         """Derivative of the loss with respect to the computed values."""
         pass
 
+    def loss_and_dloss(self, values, expected):
+        """Compute the loss and its derivative together.
+
+        Subclasses override this when both share most of the work.
+        """
+        return self.loss(values, expected), self.dloss(values, expected)
+
 class MSELoss(LossFunction):
     """Mean Squared Error Loss function."""
     def loss(self, values, expected):
@@ -101,29 +139,178 @@ class MSELoss(LossFunction):
     def dloss(self, values, expected):
         return 2*(values - expected)/values.size
 
+    def loss_and_dloss(self, values, expected):
+        diff = values - expected
+        return np.mean(diff**2), 2*diff/values.size
+
 class CrossEntropyLoss(LossFunction):
+    """Softmax cross-entropy averaged over the columns of a batch.
+
+    values has one column per sample and target_class is the class of each
+    column, as a single integer or as an array of integers. The largest
+    value of each column is subtracted before exponentiating, so large
+    values do not overflow.
+    """
     def loss(self, values, target_class):
-        return -values[target_class, 0] + np.log(np.sum(np.exp(values)))
+        return self.loss_and_dloss(values, target_class)[0]
 
     def dloss(self, values, target_class):
-        d = np.exp(values)/np.sum(np.exp(values))
-        d[target_class, 0] -= 1
-        return d
+        return self.loss_and_dloss(values, target_class)[1]
+
+    def loss_and_dloss(self, values, target_class):
+        cols = np.arange(values.shape[1])
+        shift = np.max(values, axis=0)
+        exps = np.exp(values - shift)
+        sums = np.sum(exps, axis=0)
+        # log(sum(exp(values))) == shift + log(sum(exps))
+        loss = np.mean(shift + np.log(sums) - values[target_class, cols])
+        exps /= sums
+        exps[target_class, cols] -= 1
+        exps /= values.shape[1]
+        return loss, exps
+
+
+# What an instrumented layer or network reports for each call; flops and
+# nbytes (bytes of the new arrays the call allocates) are estimates.
+Record = namedtuple("Record", "name phase seconds samples flops nbytes")
 
 
 class Layer:
-    """Model the connections between two sets of neurons in a network."""
-    def __init__(self, ins, outs, act_function):
+    """Model the connections between two sets of neurons in a network.
+
+    Parameters and intermediate results use the given dtype; float32 halves
+    the memory traffic of float64 and is plenty for training. W and b, if
+    given, are used as the parameters instead of random ones.
+    """
+    def __init__(self, ins, outs, act_function, dtype=np.float32, W=None, b=None):
         self.ins = ins
         self.outs = outs
         self.act_function = act_function
+        self.dtype = np.dtype(dtype)
+
+        self._W = create_weight_matrix(self.outs, self.ins, self.dtype) if W is None else W
+        self._b = create_bias_vector(self.outs, self.dtype) if b is None else b
+        if self._W.shape != (outs, ins) or self._b.shape != (outs, 1):
+            raise ValueError("Parameters should have shapes (outs, ins) and (outs, 1).")
+
+        # Input, pre-activation and activation of the last forward pass.
+        self._x = self._y = self._a = None
+        self._workspace = None
 
-        self._W = create_weight_matrix(self.outs, self.ins)
-        self._b = create_bias_vector(self.outs)
+    def allocate(self, batch_size):
+        """Preallocate the pre-activation and activation buffers for batches of batch_size columns.
+
+        Forward passes over batches of that size then allocate no new arrays,
+        but their result is overwritten by the next forward pass.
+        """
+        self._workspace = (
+            np.empty((self.outs, batch_size), dtype=self.dtype),
+            np.empty((self.outs, batch_size), dtype=self.dtype),
+        )
 
     def forward_pass(self, x):
-        """Compute the next set of neuron states with the given set of states."""
-        return self.act_function.f(np.dot(self._W, x) + self._b)
+        """Compute the next set of neuron states with the given set of states.
+
+        The input, pre-activation and activation are kept for `backward_pass`.
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        if self._workspace is not None and self._workspace[0].shape[1] == x.shape[1]:
+            y, a = self._workspace
+            np.dot(self._W, x, out=y)
+        else:
+            y, a = np.dot(self._W, x), None
+        y += self._b
+        self._x, self._y = x, y
+        self._a = self.act_function.f(y, out=a)
+        return self._a
+
+    def gradients(self, da):
+        """Backpropagate da, the derivative of the loss with respect to the last output.
+
+        Returns the derivatives of the loss with respect to W, to b and to
+        the input of the last forward pass, without updating anything.
+        """
+        db = self.act_function.df(self._y, self._a) * da
+        return np.dot(db, self._x.T), np.sum(db, axis=1, keepdims=True), np.dot(self._W.T, db)
+
+    def backward_pass(self, da, lr):
+        """Backpropagate da, the derivative of the loss with respect to the last output.
+
+        Updates the parameters and returns the derivative of the loss with
+        respect to the input of the last forward pass.
+        """
+        dW, db, dx = self.gradients(da)
+        self._W -= lr * dW
+        self._b -= lr * db
+        return dx
+
+    def flops(self, batch_size):
+        """Estimated floating point operations of a forward and of a backward pass."""
+        mults = self.ins * self.outs * batch_size
+        forward = 2*mults + 2*self.outs*batch_size
+        backward = 4*mults + 3*self.outs*batch_size + 2*(self._W.size + self._b.size)
+        return forward, backward
+
+    def instrument(self, sink, name=None):
+        """Send a Record for every forward and backward pass to sink, or stop if sink is None.
+
+        The timed methods are set on this instance only, so layers that are
+        not instrumented run the plain methods at no extra cost.
+        """
+        for method in ("forward_pass", "backward_pass"):
+            self.__dict__.pop(method, None)
+        if sink is None:
+            return
+
+        name = name or f"Layer({self.ins}, {self.outs})"
+        forward, backward = self.forward_pass, self.backward_pass
+        itemsize = self.dtype.itemsize
+
+        def timed_forward(x):
+            start = time.perf_counter()
+            out = forward(x)
+            seconds = time.perf_counter() - start
+            n = out.shape[1] if out.ndim > 1 else 1
+            nbytes = 0 if self._x is x else self._x.nbytes
+            if self._workspace is None or self._a is not self._workspace[1]:
+                nbytes += self._y.nbytes + self._a.nbytes
+            sink(Record(name, "forward", seconds, n, self.flops(n)[0], nbytes))
+            return out
+
+        def timed_backward(da, lr):
+            start = time.perf_counter()
+            dx = backward(da, lr)
+            seconds = time.perf_counter() - start
+            n = dx.shape[1] if dx.ndim > 1 else 1
+            # df and db, dW and lr*dW, the bias gradient and lr*db, and dx.
+            nbytes = itemsize * (2*self.outs*n + 2*self._W.size + 2*self.outs + self.ins*n)
+            sink(Record(name, "backward", seconds, n, self.flops(n)[1], nbytes))
+            return dx
+
+        self.forward_pass = timed_forward
+        self.backward_pass = timed_backward
+
+
+# Checkpoints are a magic string, the length of a JSON header, the header and
+# then the raw parameter arrays, each starting at a multiple of _ALIGN bytes.
+_CHECKPOINT_MAGIC = b"NNCKPT1\n"
+_ALIGN = 64
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+def _to_spec(obj):
+    """Describe an activation or loss function by its class name and attributes."""
+    return {"type": type(obj).__name__, "params": vars(obj)}
+
+def _from_spec(spec, base):
+    """Rebuild an activation or loss function described by _to_spec."""
+    cls = globals().get(spec["type"])
+    if not (isinstance(cls, type) and issubclass(cls, base)):
+        raise ValueError(f"Unknown {base.__name__} {spec['type']!r}.")
+    obj = cls.__new__(cls)
+    obj.__dict__.update(spec["params"])
+    return obj
 
 
 class NeuralNetwork:
@@ -138,30 +325,157 @@ class NeuralNetwork:
             if from_.outs != to_.ins:
                 raise ValueError("Layers should have compatible shapes.")
 
+    def save(self, path):
+        """Save the layers, loss function, learning rate and parameters to a checkpoint file."""
+        header = {"loss": _to_spec(self._loss_function), "learning_rate": self.lr, "layers": []}
+        arrays = []
+        offset = 0
+        for layer in self._layers:
+            entry = {
+                "ins": layer.ins,
+                "outs": layer.outs,
+                "activation": _to_spec(layer.act_function),
+                "dtype": layer.dtype.str,
+            }
+            for name, array in (("W", layer._W), ("b", layer._b)):
+                offset = _aligned(offset)
+                entry[name] = offset
+                arrays.append((offset, np.ascontiguousarray(array, dtype=layer.dtype)))
+                offset += array.nbytes
+            header["layers"].append(entry)
+
+        header = json.dumps(header).encode("utf8")
+        data_start = _aligned(len(_CHECKPOINT_MAGIC) + 8 + len(header))
+        with open(path, "wb") as f:
+            f.write(_CHECKPOINT_MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for offset, array in arrays:
+                f.seek(data_start + offset)
+                f.write(array.tobytes())
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Load a network saved with `save`.
+
+        By default the parameters are memory-mapped read-only, so inference
+        processes start instantly and share the pages of the file; use
+        mmap_mode="c" (copy-on-write) or None (read into memory) to train.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(_CHECKPOINT_MAGIC)) != _CHECKPOINT_MAGIC:
+                raise ValueError(f"{path} is not a network checkpoint.")
+            size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(size))
+        data_start = _aligned(len(_CHECKPOINT_MAGIC) + 8 + size)
+
+        def read(offset, dtype, shape):
+            if mmap_mode:
+                return np.memmap(path, dtype=dtype, mode=mmap_mode, offset=data_start + offset, shape=shape)
+            count = shape[0]*shape[1]
+            return np.fromfile(path, dtype=dtype, count=count, offset=data_start + offset).reshape(shape)
+
+        layers = []
+        for entry in header["layers"]:
+            ins, outs, dtype = entry["ins"], entry["outs"], np.dtype(entry["dtype"])
+            layers.append(Layer(
+                ins, outs, _from_spec(entry["activation"], ActivationFunction), dtype,
+                W=read(entry["W"], dtype, (outs, ins)),
+                b=read(entry["b"], dtype, (outs, 1)),
+            ))
+        return cls(layers, _from_spec(header["loss"], LossFunction), header["learning_rate"])
+
     def forward_pass(self, x):
         out = x
         for layer in self._layers:
             out = layer.forward_pass(out)
         return out
 
+    def predict_iter(self, X, batch_size=1000):
+        """Yield the network outputs for the columns of X, batch_size columns at a time.
+
+        With preallocated layers the yielded arrays are reused by the next step.
+        """
+        for start in range(0, X.shape[1], batch_size):
+            yield self.forward_pass(X[:, start:start + batch_size])
+
+    def predict(self, X, batch_size=1000):
+        """Network outputs for all the columns of X, computed in chunks of batch_size columns."""
+        last = self._layers[-1]
+        out = np.empty((last.outs, X.shape[1]), dtype=last.dtype)
+        for start, chunk in zip(range(0, X.shape[1], batch_size), self.predict_iter(X, batch_size)):
+            out[:, start:start + batch_size] = chunk
+        return out
+
     def loss(self, values, expected):
         return self._loss_function.loss(values, expected)
 
     def train(self, x, t):
-        """Train the network on input x and expected output t."""
-
-        # Accumulate intermediate results during forward pass.
-        xs = [x]
+        """Train the network on input x and expected output t.
+
+        x can also be a matrix with one sample per column, in which case t
+        holds the expected output of each column and the parameters are
+        updated once, with the gradient of the loss averaged over the batch.
+        Returns the loss of the network before the update.
+        """
+
+        # Each layer keeps what it needs for the backward pass.
+        out = self.forward_pass(x)
+        loss, dx = self._loss_function.loss_and_dloss(out, t)
+        for layer in self._layers[::-1]:
+            dx = layer.backward_pass(dx, self.lr)
+        return loss
+
+    def instrument(self, sink):
+        """Send Records for every layer pass and every training step to sink, or stop if sink is None.
+
+        Layers are named layer0, layer1, ... and training steps are reported
+        under the name network with phase train.
+        """
+        for i, layer in enumerate(self._layers):
+            layer.instrument(sink, f"layer{i}")
+        self.__dict__.pop("train", None)
+        if sink is None:
+            return
+
+        train = self.train
+
+        def timed_train(x, t):
+            start = time.perf_counter()
+            loss = train(x, t)
+            seconds = time.perf_counter() - start
+            n = x.shape[1] if np.ndim(x) > 1 else 1
+            flops = sum(sum(layer.flops(n)) for layer in self._layers)
+            sink(Record("network", "train", seconds, n, flops, None))
+            return loss
+
+        self.train = timed_train
+
+    def gradients(self, x, t):
+        """Loss on input x and expected output t, and the (dW, db) of every layer.
+
+        Nothing is updated, so the gradients can be combined before applying them.
+        """
+        out = self.forward_pass(x)
+        loss, dx = self._loss_function.loss_and_dloss(out, t)
+        grads = []
+        for layer in self._layers[::-1]:
+            dW, db, dx = layer.gradients(dx)
+            grads.append((dW, db))
+        return loss, grads[::-1]
+
+    def allocate(self, batch_size):
+        """Preallocate the layer workspaces for batches of batch_size columns."""
         for layer in self._layers:
-            xs.append(layer.forward_pass(xs[-1]))
-
-        dx = self._loss_function.dloss(xs.pop(), t)
-        for layer, x in zip(self._layers[::-1], xs[::-1]):
-            # Compute the derivatives
-            y = np.dot(layer._W, x) + layer._b
-            db = layer.act_function.df(y) * dx
-            dx = np.dot(layer._W.T, db)
-            dW = np.dot(db, x.T)
-            # Update parameters.
-            layer._W -= self.lr * dW
-            layer._b -= self.lr * db
+            layer.allocate(batch_size)
+
+    def train_batch(self, X, T, batch_size=None):
+        """Train the network on the columns of X in minibatches of batch_size columns.
+
+        T holds the expected outputs in its last axis: a vector of classes for
+        CrossEntropyLoss or a matrix with one column per sample for MSELoss.
+        """
+        batch_size = batch_size or X.shape[1]
+        for start in range(0, X.shape[1], batch_size):
+            end = start + batch_size
+            self.train(X[:, start:end], T[..., start:end])
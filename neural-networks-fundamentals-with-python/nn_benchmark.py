@@ -0,0 +1,166 @@
+"""
+Benchmark the building blocks of nn.py on synthetic data with fixed seeds.
+
+Examples:
+    python nn_benchmark.py run --out before.json
+    python nn_benchmark.py run --out after.json
+    python nn_benchmark.py compare before.json after.json --threshold 0.1
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+import nn
+from data import DataLoader
+
+WIDTHS = (16, 64, 256)
+BATCH_SIZES = (1, 32, 256)
+
+def best_time(fn, repeat=5, min_seconds=0.05):
+    """Best time per call of fn over `repeat` rounds of at least min_seconds each."""
+    fn()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_seconds:
+            break
+        number *= 2
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+def subclasses(cls):
+    """All the subclasses of cls, direct or not, parents first."""
+    for sub in cls.__subclasses__():
+        yield sub
+        yield from subclasses(sub)
+
+def make_net(width, seed=0):
+    """MNIST-shaped network, 784 inputs and 10 classes, with one hidden layer of the given width."""
+    np.random.seed(seed)
+    layers = [
+        nn.Layer(784, width, nn.LeakyReLU()),
+        nn.Layer(width, 10, nn.Id()),
+    ]
+    return nn.NeuralNetwork(layers, nn.CrossEntropyLoss(), 0.001)
+
+def mnist_like(samples, seed=0):
+    """Random uint8 rows laid out like the MNIST data: a label and 784 pixels."""
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 256, (samples, 785), dtype=np.uint8)
+    data[:, 0] %= 10
+    return data
+
+def cases(widths=WIDTHS, batch_sizes=BATCH_SIZES, samples=10_000):
+    """Yield (name, function) pairs, each function running one benchmarked operation."""
+    rng = np.random.default_rng(0)
+    for width in widths:
+        for batch_size in batch_sizes:
+            x = rng.random((784, batch_size), dtype=np.float32)
+            t = rng.integers(0, 10, batch_size)
+            net = make_net(width)
+            layer = net._layers[0]
+            yield f"layer.forward_pass/784x{width}/batch{batch_size}", lambda layer=layer, x=x: layer.forward_pass(x)
+            yield f"net.train/784x{width}x10/batch{batch_size}", lambda net=net, x=x, t=t: net.train(x, t)
+
+    for batch_size in batch_sizes:
+        x = rng.standard_normal((max(widths), batch_size), dtype=np.float32)
+        for act_class in subclasses(nn.ActivationFunction):
+            act = act_class()
+            fx = act.f(x)
+            yield f"{act_class.__name__}.f/{max(widths)}/batch{batch_size}", lambda act=act, x=x: act.f(x)
+            yield f"{act_class.__name__}.df/{max(widths)}/batch{batch_size}", lambda act=act, x=x, fx=fx: act.df(x, fx)
+
+        values = rng.standard_normal((10, batch_size), dtype=np.float32)
+        targets = {
+            nn.MSELoss: rng.random((10, batch_size), dtype=np.float32),
+            nn.CrossEntropyLoss: rng.integers(0, 10, batch_size),
+        }
+        for loss_class in subclasses(nn.LossFunction):
+            loss, t = loss_class(), targets[loss_class]
+            yield f"{loss_class.__name__}/batch{batch_size}", lambda loss=loss, values=values, t=t: loss.loss_and_dloss(values, t)
+
+    data = mnist_like(samples)
+    for width in widths:
+        def epoch(width=width):
+            net = make_net(width)
+            loader = DataLoader(data[:, 1:], data[:, 0], batch_size=32, seed=0)
+            for x, t in loader:
+                net.train(x, t)
+        yield f"epoch/784x{width}x10/{samples}samples", epoch
+
+def run(widths=WIDTHS, batch_sizes=BATCH_SIZES, samples=10_000, repeat=5):
+    """Time every case and return the results with a description of the machine."""
+    results = {}
+    for name, fn in cases(widths, batch_sizes, samples):
+        results[name] = best_time(fn, repeat)
+        print(f"{name:<48} {1e6*results[name]:>12.1f} us", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "widths": list(widths),
+            "batch_sizes": list(batch_sizes),
+            "samples": samples,
+        },
+        "results": results,
+    }
+
+def compare(before, after, threshold=0.1):
+    """(name, before, after, ratio, regressed) of every case timed in both runs.
+
+    A case regressed if it got more than `threshold` times slower.
+    """
+    rows = []
+    for name, old in before["results"].items():
+        if name in after["results"]:
+            new = after["results"][name]
+            ratio = new / old
+            rows.append((name, old, new, ratio, ratio > 1 + threshold))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="time every case and write the results as JSON")
+    run_parser.add_argument("--out", default=None, help="JSON file for the results, stdout if not given")
+    run_parser.add_argument("--widths", type=int, nargs="+", default=list(WIDTHS))
+    run_parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    run_parser.add_argument("--samples", type=int, default=10_000, help="samples in the end-to-end epoch")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    compare_parser = commands.add_parser("compare", help="flag the cases that got slower between two runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown to flag")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = json.dumps(run(args.widths, args.batch_sizes, args.samples, args.repeat), indent=2)
+        if args.out is None:
+            print(results)
+        else:
+            with open(args.out, "w") as f:
+                f.write(results + "\n")
+    else:
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        rows = compare(before, after, args.threshold)
+        print(f"{'case':<48} {'before us':>12} {'after us':>12} {'ratio':>7}")
+        for name, old, new, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<48} {1e6*old:>12.1f} {1e6*new:>12.1f} {ratio:>7.2f}{flag}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
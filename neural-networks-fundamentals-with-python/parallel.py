@@ -0,0 +1,202 @@
+"""
+Data-parallel training of a NeuralNetwork over a pool of processes.
+
+The parameters of every layer live in one shared memory block that all the
+processes map, so weights are never pickled between steps: workers read the
+current weights in place and hand their gradients back through a second
+shared block with one slot per shard.
+
+Example:
+    python parallel.py --workers 1 2 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import nn
+
+MODES = ("sync", "hogwild")
+
+# State of a worker process, set up once by _init_worker.
+_worker = {}
+
+def _n_params(net):
+    return sum(layer._W.size + layer._b.size for layer in net._layers)
+
+def _bind(net, flat):
+    """Make the W and b of every layer views over consecutive parts of flat."""
+    offset = 0
+    for layer in net._layers:
+        for name in ("_W", "_b"):
+            param = getattr(layer, name)
+            view = flat[offset:offset + param.size].reshape(param.shape)
+            setattr(layer, name, view)
+            offset += param.size
+
+def _flatten(grads, out):
+    """Write the (dW, db) of every layer into the flat vector out."""
+    offset = 0
+    for dW, db in grads:
+        for grad in (dW, db):
+            out[offset:offset + grad.size] = grad.ravel()
+            offset += grad.size
+
+def _init_worker(net, X, T, params_name, grads_name, n_slots):
+    params = shared_memory.SharedMemory(name=params_name)
+    grads = shared_memory.SharedMemory(name=grads_name)
+    dtype = net._layers[0]._W.dtype
+    n = _n_params(net)
+    _bind(net, np.ndarray((n,), dtype=dtype, buffer=params.buf))
+    _worker.update(
+        net=net, X=X, T=T, shm=(params, grads),
+        grads=np.ndarray((n_slots, n), dtype=dtype, buffer=grads.buf),
+    )
+
+def _shard_gradients(task):
+    """Gradients of one shard of a minibatch, written to the slot of the shard."""
+    slot, idx = task
+    net = _worker["net"]
+    loss, grads = net.gradients(_worker["X"][:, idx], _worker["T"][..., idx])
+    _flatten(grads, _worker["grads"][slot])
+    return loss
+
+def _hogwild(task):
+    """Train on a share of the epoch, updating the shared weights without locks."""
+    idx, batch_size = task
+    net = _worker["net"]
+    losses = []
+    for start in range(0, len(idx), batch_size):
+        batch = idx[start:start + batch_size]
+        loss, grads = net.gradients(_worker["X"][:, batch], _worker["T"][..., batch])
+        for layer, (dW, db) in zip(net._layers, grads):
+            layer._W -= net.lr * dW
+            layer._b -= net.lr * db
+        losses.append(loss)
+    return losses
+
+
+class ParallelTrainer:
+    """Train a network on (X, T) with `workers` processes.
+
+    X has one sample per column and T has one class per sample or one column
+    per sample, like for NeuralNetwork.train_batch. Both are handed to the
+    workers once, when the pool starts.
+
+    In "sync" mode every minibatch is split across the workers, the gradients
+    of the shards are averaged and the step is applied once, which gives the
+    same updates as training on the whole minibatch. In "hogwild" mode every
+    worker runs its own minibatches over a share of the epoch and applies its
+    steps straight to the shared weights, without locking.
+
+    While the trainer is open the layers of net are views over the shared
+    memory; close (or leaving the with block) copies the weights back.
+    """
+    def __init__(self, net, X, T, workers=None, mode="sync"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, pick one of {MODES}.")
+        if X.shape[1] != T.shape[-1]:
+            raise ValueError("X and T should have the same number of samples.")
+        dtypes = {param.dtype for layer in net._layers for param in (layer._W, layer._b)}
+        if len(dtypes) != 1:
+            raise ValueError("All layers should use the same dtype.")
+        dtype = dtypes.pop()
+
+        self.net = net
+        self.mode = mode
+        self.workers = workers or os.cpu_count()
+        self._X = X
+        self._T = T
+        n = _n_params(net)
+        self._params_shm = shared_memory.SharedMemory(create=True, size=n*dtype.itemsize)
+        self._grads_shm = shared_memory.SharedMemory(create=True, size=self.workers*n*dtype.itemsize)
+        self._params = np.ndarray((n,), dtype=dtype, buffer=self._params_shm.buf)
+        self._grads = np.ndarray((self.workers, n), dtype=dtype, buffer=self._grads_shm.buf)
+        _flatten([(layer._W, layer._b) for layer in net._layers], self._params)
+        _bind(net, self._params)
+        self._pool = mp.Pool(
+            self.workers, _init_worker,
+            (net, X, T, self._params_shm.name, self._grads_shm.name, self.workers),
+        )
+
+    def train_epoch(self, batch_size=32, shuffle=True, seed=None):
+        """Train one epoch and return the mean loss of its minibatches."""
+        n = self._X.shape[1]
+        order = np.random.default_rng(seed).permutation(n) if shuffle else np.arange(n)
+        if self.mode == "hogwild":
+            shares = np.array_split(order, self.workers)
+            results = self._pool.map(_hogwild, [(share, batch_size) for share in shares])
+            return float(np.mean([loss for losses in results for loss in losses]))
+
+        losses = []
+        for start in range(0, n, batch_size):
+            batch = order[start:start + batch_size]
+            shards = [shard for shard in np.array_split(batch, self.workers) if len(shard)]
+            shard_losses = self._pool.map(_shard_gradients, enumerate(shards))
+            # Each shard's gradient is a mean over its samples, so weight by shard size.
+            weights = np.array([len(shard) for shard in shards], dtype=self._params.dtype) / len(batch)
+            self._params -= self.net.lr * (weights @ self._grads[:len(shards)])
+            losses.append(float(np.dot(weights, shard_losses)))
+        return float(np.mean(losses))
+
+    def close(self):
+        """Stop the workers and give the network its own copy of the weights."""
+        if self._pool is None:
+            return
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        _bind(self.net, self._params.copy())
+        del self._params, self._grads
+        for shm in (self._params_shm, self._grads_shm):
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def scaling(make_net, X, T, worker_counts, mode="sync", batch_size=256, epochs=1):
+    """Time training with each number of workers.
+
+    Returns a list of (workers, samples per second, efficiency), where the
+    efficiency is the speedup over the first entry divided by the increase in
+    workers, so 1.0 means perfect scaling.
+    """
+    results = []
+    for workers in worker_counts:
+        with ParallelTrainer(make_net(), X, T, workers, mode) as trainer:
+            start = time.perf_counter()
+            for epoch in range(epochs):
+                trainer.train_epoch(batch_size, seed=epoch)
+            rate = epochs * X.shape[1] / (time.perf_counter() - start)
+        base_workers, base_rate = results[0][:2] if results else (workers, rate)
+        results.append((workers, rate, (rate / base_rate) / (workers / base_workers)))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to time")
+    parser.add_argument("--mode", choices=MODES, default="sync")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--samples", type=int, default=60_000)
+    args = parser.parse_args()
+
+    # MNIST-shaped synthetic data: 784 inputs, 10 classes.
+    rng = np.random.default_rng(73)
+    X = rng.random((784, args.samples), dtype=np.float32)
+    T = rng.integers(0, 10, args.samples)
+
+    def make_net():
+        return nn.NeuralNetwork([
+            nn.Layer(784, 64, nn.LeakyReLU()),
+            nn.Layer(64, 10, nn.Id()),
+        ], nn.CrossEntropyLoss(), 0.03)
+
+    print(f"mode={args.mode} batch_size={args.batch_size} samples={args.samples}")
+    for workers, rate, efficiency in scaling(make_net, X, T, args.workers, args.mode, args.batch_size):
+        print(f"{workers} workers: {rate:,.0f} samples/s, efficiency {efficiency:.2f}")
@@ -1,40 +1,75 @@
+"""
+Learn whether points of the square [-2,2]×[-2,2] lie in the 1st/3rd or in the
+2nd/4th quadrants, a synthetic problem that needs no data files.
+
+Example:
+    python quadrants.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import time
 from nn import NeuralNetwork, Layer, LeakyReLU, MSELoss
+from data import DataLoader
 # import matplotlib.pyplot as plt
 import numpy as np
 
-def col(a):
-    """Make sure the array is a column."""
-    return np.atleast_2d(a).T
-
-N = 100_000     # Create N points inside the square [-2,2]×[-2,2]
-data = np.random.uniform(low=-2, high=2, size=(2, N))
-
-ts = np.zeros(shape=(2, N))
-ts[0, data[0,]*data[1,]>0] = 1
-ts[1, :] = 1 - ts[0, :]
-
-net = NeuralNetwork([
-    Layer(2, 3, LeakyReLU()),
-    Layer(3, 2, LeakyReLU()),
-], MSELoss(), 0.05)
-
-def assess(net, data, ts):
-    correct = 0
-    cs = []
-    for i in range(data.shape[1]):
-        out = net.forward_pass(col(data[:, i]))
-        guess = np.argmax(np.ndarray.flatten(out))
-        if ts[guess, i]:
-            correct += 1
-        cs.append(guess)
+def make_data(N, seed=None, dtype=np.float32):
+    """N points inside the square [-2,2]×[-2,2] as a (2, N) array, and their (2, N) targets."""
+    rng = np.random.default_rng(seed)
+    data = rng.uniform(low=-2, high=2, size=(2, N)).astype(dtype)
+
+    ts = np.zeros(shape=(2, N), dtype=dtype)
+    ts[0, data[0,]*data[1,]>0] = 1
+    ts[1, :] = 1 - ts[0, :]
+    return data, ts
+
+def make_net():
+    return NeuralNetwork([
+        Layer(2, 3, LeakyReLU()),
+        Layer(3, 2, LeakyReLU()),
+    ], MSELoss(), 0.05)
+
+def assess(net, data, ts, batch_size=10_000):
+    """Number of points whose quadrant the network guesses right."""
+    guesses = np.argmax(net.predict(data, batch_size), axis=0)
     # fig = plt.figure()
-    # plt.scatter(data[0, :1000], data[1, :1000], c=cs)
+    # plt.scatter(data[0, :1000], data[1, :1000], c=guesses[:1000])
     # fig.show()
     # input()
-    return correct
+    return int(np.count_nonzero(ts[guesses, np.arange(data.shape[1])]))
+
+def run(N, batch_size=8, test_to=1000, seed=None):
+    """Train a new network on N points, testing on the first test_to of them.
+
+    Returns the points guessed right before and after training, and the training time.
+    """
+    data, ts = make_data(N, seed)
+    if seed is not None:
+        np.random.seed(seed)    # The layers draw their initial weights from np.random.
+    net = make_net()
+    before = assess(net, data[:, :test_to], ts[:, :test_to])
+    start = time.perf_counter()
+    # The transposes are views, so only the shuffled batches get copied.
+    for x, t in DataLoader(data[:, test_to:].T, ts[:, test_to:].T, batch_size, seed=seed):
+        net.train(x, t)
+    seconds = time.perf_counter() - start
+    return before, assess(net, data[:, :test_to], ts[:, :test_to]), seconds
+
+def sweep(sizes, batch_size=8, test_to=1000, seed=0):
+    """(N, seconds, samples/s, accuracy after training) of a run with every N in sizes."""
+    rows = []
+    for N in sizes:
+        _, correct, seconds = run(N, batch_size, test_to, seed)
+        rows.append((N, seconds, (N - test_to)/seconds, correct/test_to))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000], help="numbers of points to try")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
 
-test_to = 1000
-print(assess(net, data[:, :test_to], ts[:, :test_to]))
-for i in range(test_to, N):
-    net.train(col(data[:, i]), col(ts[:, i]))
-print(assess(net, data[:, :test_to], ts[:, :test_to]))
+    print(f"{'N':>10} {'seconds':>9} {'samples/s':>12} {'accuracy':>9}")
+    for N, seconds, rate, accuracy in sweep(args.sizes, args.batch_size, seed=args.seed):
+        print(f"{N:>10} {seconds:>9.3f} {rate:>12,.0f} {accuracy:>9.3f}")
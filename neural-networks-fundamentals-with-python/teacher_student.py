@@ -2,41 +2,92 @@
 Experiment with a teacher-student model with the MNIST data.
 """
 
+import os
+import numpy as np
 from nn import NeuralNetwork, Layer, LeakyReLU, Sigmoid, CrossEntropyLoss, MSELoss
-from mnist import to_col, load_data, train, test
+from data import DataLoader
+from mnist import load_mnist, train, test
 
-def train_student(student, teacher, train_data):
-    """Train a student network to behave like the teacher network."""
+def cache_teacher(teacher, inputs, path=None, dtype=np.float16, batch_size=1000):
+    """Teacher outputs for every row of inputs, one row per sample.
+
+    The teacher runs once, batch_size rows at a time. With a path the outputs
+    go to a memory-mapped .npy file that later runs can load with np.load.
+    """
+    shape = (len(inputs), teacher._layers[-1].outs)
+    if path is None:
+        cache = np.empty(shape, dtype=dtype)
+    else:
+        # Written next to path and renamed at the end, like mnist.convert_csv,
+        # so a later run never reuses a half-written file.
+        tmp_path = path + ".tmp"
+        cache = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+    for start in range(0, len(inputs), batch_size):
+        x = np.asarray(inputs[start:start + batch_size], dtype=teacher._layers[0].dtype).T
+        cache[start:start + batch_size] = teacher.forward_pass(x).T
+    if path is None:
+        return cache
+    cache.flush()
+    del cache
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+def train_students(students, inputs, cache, batch_size=32, epochs=1):
+    """Train several student networks side by side on the cached teacher outputs.
+
+    Every minibatch is gathered once and used by all the students.
+    """
+    loader = DataLoader(inputs, cache, batch_size=batch_size)
+    for epoch in range(epochs):
+        for i, (x, t) in enumerate(loader):
+            if not i % max(1, 1000 // batch_size):
+                print(i*batch_size)
 
-    for i, train_row in enumerate(train_data):
-        if not i%1000:
-            print(i)
+            for student in students:
+                student.train(x, t.astype(student._layers[-1].dtype, copy=False))
 
-        x = to_col(train_row[1:])
-        teacher_out = teacher.forward_pass(x)
-        student.train(x, teacher_out)
+def train_student(student, teacher, train_data, batch_size=32):
+    """Train a student network to behave like the teacher network."""
+    inputs = train_data[:, 1:]
+    train_students([student], inputs, cache_teacher(teacher, inputs), batch_size)
+
+TEACHER_CHECKPOINT = "mnistdata/teacher.ckpt"
+TEACHER_OUTPUTS = "mnistdata/teacher_outputs.npy"
 
 if __name__ == "__main__":
-    teacher_layers = [
-        Layer(784, 16, LeakyReLU()),
-        Layer(16, 16, LeakyReLU()),
-        Layer(16, 10, LeakyReLU()),
-    ]
-    teacher_net = NeuralNetwork(teacher_layers, CrossEntropyLoss(), 0.001)
-    
-    train_data = load_data("mnistdata/mnist_train.csv", delimiter=",", dtype=int)
-    train(teacher_net, train_data)
-
-    test_data = load_data("mnistdata/mnist_test.csv", delimiter=",", dtype=int)
+    train_data = load_mnist("mnistdata/mnist_train.csv")
+
+    if os.path.exists(TEACHER_CHECKPOINT):
+        teacher_net = NeuralNetwork.load(TEACHER_CHECKPOINT)
+    else:
+        teacher_layers = [
+            Layer(784, 16, LeakyReLU()),
+            Layer(16, 16, LeakyReLU()),
+            Layer(16, 10, LeakyReLU()),
+        ]
+        teacher_net = NeuralNetwork(teacher_layers, CrossEntropyLoss(), 0.001)
+        train(teacher_net, train_data)
+        teacher_net.save(TEACHER_CHECKPOINT)
+
+    test_data = load_mnist("mnistdata/mnist_test.csv")
     accuracy = test(teacher_net, test_data)
     print(f"Accuracy of the teacher net is {100*accuracy:.2f}")
 
-    student_layers = [
-        Layer(784, 10, Sigmoid()),
-    ]
-    student_net = NeuralNetwork(student_layers, MSELoss(), 0.005)
+    inputs = train_data[:, 1:]
+    if os.path.exists(TEACHER_OUTPUTS) and os.path.getmtime(TEACHER_OUTPUTS) >= os.path.getmtime(TEACHER_CHECKPOINT):
+        cache = np.load(TEACHER_OUTPUTS, mmap_mode="r")
+    else:
+        cache = cache_teacher(teacher_net, inputs, TEACHER_OUTPUTS)
 
-    train_student(student_net, teacher_net, train_data)
+    students = {
+        "784-10": NeuralNetwork([Layer(784, 10, Sigmoid())], MSELoss(), 0.005),
+        "784-16-10": NeuralNetwork([
+            Layer(784, 16, LeakyReLU()),
+            Layer(16, 10, Sigmoid()),
+        ], MSELoss(), 0.005),
+    }
+    train_students(list(students.values()), inputs, cache)
 
-    student_accuracy = test(student_net, test_data)
-    print(f"Accuracy of the student net is {100*accuracy:.2f}")
+    for name, student_net in students.items():
+        student_accuracy = test(student_net, test_data)
+        print(f"Accuracy of the {name} student net is {100*student_accuracy:.2f}")